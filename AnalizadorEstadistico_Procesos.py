@@ -3,13 +3,24 @@ import numpy as np
 import matplotlib.pyplot as plt
 import scipy.stats as stats
 from scipy import integrate
+from scipy.special import inv_boxcox
+import hashlib
+import os
+import sys
 
 class AnalizadorEstadisticoProcesos:
-    def __init__(self):
+    def __init__(self, producto="General"):
         self.LIMITE_INFERIOR = 0.08  # 0.08M
         self.LIMITE_SUPERIOR = 0.12  # 0.12M
         self.OBJETIVO = 0.10         # 0.10M
         
+        # Capacidad no normal: el ajuste se hace sobre un resumen de cuantiles
+        self.TAMANO_AJUSTE = 2000    # Puntos máximos usados para ajustar Box-Cox/Johnson
+        self.ARCHIVO_TRANSFORMACIONES = "parametros_transformacion.xlsx"
+        self.MINIMO_PERCENTILES_EMPIRICOS = 1000  # Con menos datos los percentiles 0.135/99.865 no son fiables
+        self.producto = producto
+        self.cache_transformaciones = None  # {producto: parámetros ajustados}
+        
         print(f"📊 ANALIZADOR ESTADÍSTICO AVANZADO - CONTROL DE PROCESOS")
         print(f"🎯 Límites: {self.LIMITE_INFERIOR}M - {self.OBJETIVO}M - {self.LIMITE_SUPERIOR}M")
     
@@ -116,7 +127,10 @@ class AnalizadorEstadisticoProcesos:
         asimetria = stats.skew(todos_datos)
         curtosis = stats.kurtosis(todos_datos)
         
-        return {
+        # Capacidad no normal (Box-Cox / Johnson / percentiles) si falla la normalidad
+        capacidad_no_normal = self.calcular_capacidad_no_normal(todos_datos, p_value_sw > 0.05)
+        
+        resultados = {
             'n_datos': len(todos_datos),
             'n_subgrupos': len(self.subgrupos),
             'n_lotes': len(self.lotes),
@@ -144,6 +158,9 @@ class AnalizadorEstadisticoProcesos:
             'es_normal': p_value_sw > 0.05,
             'dentro_espec': (1 - (fuera_inf + fuera_sup)) * 100
         }
+        resultados.update(capacidad_no_normal)
+        
+        return resultados
     
     def calcular_cpk(self, datos, desviacion):
         """Calcula índice de capacidad del proceso Cpk/Ppk"""
@@ -164,8 +181,222 @@ class AnalizadorEstadisticoProcesos:
         
         return ppm, fuera_inferior, fuera_superior
     
+    def obtener_resumen_ajuste(self, datos):
+        """Resume los datos en cuantiles equiespaciados para ajustar transformaciones rápido"""
+        if len(datos) <= self.TAMANO_AJUSTE:
+            return np.sort(datos)
+        
+        # Los cuantiles conservan la forma de la distribución con un tamaño fijo
+        probabilidades = (np.arange(self.TAMANO_AJUSTE) + 0.5) / self.TAMANO_AJUSTE
+        return np.quantile(datos, probabilidades)
+    
+    def cargar_cache_transformaciones(self):
+        """Carga los parámetros de transformación guardados por producto"""
+        if self.cache_transformaciones is not None:
+            return
+        
+        self.cache_transformaciones = {}
+        if not os.path.exists(self.ARCHIVO_TRANSFORMACIONES):
+            return
+        
+        try:
+            df_cache = pd.read_excel(self.ARCHIVO_TRANSFORMACIONES)
+            for fila in df_cache.to_dict('records'):
+                self.cache_transformaciones[str(fila['producto'])] = fila
+        except Exception as e:
+            print(f"⚠️  No se pudo leer la caché de transformaciones: {e}")
+    
+    def guardar_cache_transformaciones(self):
+        """Guarda los parámetros de transformación de todos los productos"""
+        try:
+            df_cache = pd.DataFrame(list(self.cache_transformaciones.values()))
+            df_cache.to_excel(self.ARCHIVO_TRANSFORMACIONES, index=False)
+        except Exception as e:
+            print(f"⚠️  No se pudo guardar la caché de transformaciones: {e}")
+    
+    def transformar_datos(self, datos, parametros):
+        """Aplica la transformación ajustada (Box-Cox o Johnson SU) a los datos"""
+        datos = np.asarray(datos, dtype=float)
+        
+        if parametros['metodo'] == 'Box-Cox':
+            return stats.boxcox(datos, lmbda=parametros['lambda_boxcox'])
+        
+        # Johnson SU: z = γ + δ·asinh((x - ξ) / λ)
+        return parametros['johnson_gamma'] + parametros['johnson_delta'] * np.arcsinh(
+            (datos - parametros['johnson_xi']) / parametros['johnson_lambda'])
+    
+    def ajustar_transformacion(self, datos):
+        """Ajusta Box-Cox y Johnson SU sobre el resumen de cuantiles y cachea la mejor por producto"""
+        self.cargar_cache_transformaciones()
+        
+        resumen = self.obtener_resumen_ajuste(datos)
+        huella = hashlib.sha1(np.round(resumen, 10).tobytes()).hexdigest()
+        
+        cacheado = self.cache_transformaciones.get(self.producto)
+        if cacheado is not None and cacheado['huella'] == huella:
+            print(f"   ♻️  Transformación {cacheado['metodo']} reutilizada desde caché ({self.producto})")
+            return cacheado
+        
+        if np.ptp(resumen) == 0:
+            print(f"⚠️  Datos constantes: no se puede ajustar ninguna transformación")
+            return None
+        
+        print(f"   🔧 Ajustando transformaciones sobre {len(resumen)} cuantiles...")
+        candidatos = []
+        
+        # Box-Cox (solo para datos estrictamente positivos)
+        if np.min(datos) > 0:
+            try:
+                transformados, lambda_boxcox = stats.boxcox(resumen)
+                candidatos.append({
+                    'metodo': 'Box-Cox',
+                    'lambda_boxcox': lambda_boxcox,
+                    'r_qq_transformado': stats.probplot(transformados, fit=True)[1][2]
+                })
+            except Exception as e:
+                print(f"⚠️  No se pudo ajustar Box-Cox: {e}")
+        
+        # Johnson SU (acepta cualquier signo); si el producto ya tenía un ajuste
+        # Johnson, se usa como punto de partida de la optimización
+        try:
+            if cacheado is not None and not pd.isna(cacheado.get('johnson_delta', np.nan)):
+                gamma, delta, xi, lam = stats.johnsonsu.fit(
+                    resumen, cacheado['johnson_gamma'], cacheado['johnson_delta'],
+                    loc=cacheado['johnson_xi'], scale=cacheado['johnson_lambda'])
+            else:
+                gamma, delta, xi, lam = stats.johnsonsu.fit(resumen)
+            transformados = gamma + delta * np.arcsinh((resumen - xi) / lam)
+            candidatos.append({
+                'metodo': 'Johnson SU',
+                'johnson_gamma': gamma,
+                'johnson_delta': delta,
+                'johnson_xi': xi,
+                'johnson_lambda': lam,
+                'r_qq_transformado': stats.probplot(transformados, fit=True)[1][2]
+            })
+        except Exception as e:
+            print(f"⚠️  No se pudo ajustar Johnson SU: {e}")
+        
+        candidatos = [c for c in candidatos if np.isfinite(c['r_qq_transformado'])]
+        if not candidatos:
+            return None
+        
+        # Se elige la transformación con mejor ajuste en el gráfico Q-Q
+        mejor = max(candidatos, key=lambda c: c['r_qq_transformado'])
+        parametros = {
+            'producto': self.producto,
+            'huella': huella,
+            'metodo': mejor['metodo'],
+            'lambda_boxcox': mejor.get('lambda_boxcox', np.nan),
+            'johnson_gamma': mejor.get('johnson_gamma', np.nan),
+            'johnson_delta': mejor.get('johnson_delta', np.nan),
+            'johnson_xi': mejor.get('johnson_xi', np.nan),
+            'johnson_lambda': mejor.get('johnson_lambda', np.nan),
+            'r_qq_transformado': mejor['r_qq_transformado']
+        }
+        
+        self.cache_transformaciones[self.producto] = parametros
+        self.guardar_cache_transformaciones()
+        
+        return parametros
+    
+    def calcular_percentiles_ajustados(self, parametros, media_z, desviacion_z):
+        """Obtiene los percentiles 0.135/50/99.865 retrotransformando Φ(-3), Φ(0), Φ(3) por el ajuste"""
+        z = np.array([-3.0, 0.0, 3.0])
+        
+        if parametros['metodo'] == 'Box-Cox':
+            # Los datos transformados siguen N(media_z, desviacion_z)
+            puntos = inv_boxcox(media_z + z * desviacion_z, parametros['lambda_boxcox'])
+        else:
+            # Johnson SU: x = ξ + λ·sinh((z - γ) / δ) con z ~ N(0, 1)
+            puntos = parametros['johnson_xi'] + parametros['johnson_lambda'] * np.sinh(
+                (z - parametros['johnson_gamma']) / parametros['johnson_delta'])
+        
+        return puntos if np.all(np.isfinite(puntos)) else None
+    
+    def calcular_capacidad_percentiles(self, p_inferior, p_mediana, p_superior):
+        """Calcula Pp/Ppk por el método de percentiles (ISO 22514-2)"""
+        pp = (self.LIMITE_SUPERIOR - self.LIMITE_INFERIOR) / (p_superior - p_inferior)
+        ppk_superior = (self.LIMITE_SUPERIOR - p_mediana) / (p_superior - p_mediana)
+        ppk_inferior = (p_mediana - self.LIMITE_INFERIOR) / (p_mediana - p_inferior)
+        
+        return pp, min(ppk_superior, ppk_inferior)
+    
+    def calcular_capacidad_no_normal(self, datos, es_normal):
+        """Calcula capacidad no normal con transformación o percentiles cuando los datos no son normales"""
+        capacidad = {
+            'metodo_no_normal': 'No requerido',
+            'parametros_transformacion': '',
+            'origen_percentiles': '',
+            'r_qq_transformado': np.nan,
+            'pp_transformado': np.nan,
+            'ppk_transformado': np.nan,
+            'pp_percentil': np.nan,
+            'ppk_percentil': np.nan
+        }
+        
+        if es_normal:
+            return capacidad
+        
+        print(f"\n🔀 DATOS NO NORMALES - CALCULANDO CAPACIDAD NO NORMAL ({self.producto})...")
+        
+        parametros = self.ajustar_transformacion(datos)
+        if parametros is None:
+            capacidad['metodo_no_normal'] = 'Sin ajuste'
+            self.asignar_percentiles_empiricos(datos, capacidad)
+            return capacidad
+        
+        # Capacidad en el espacio transformado (la transformación es monótona creciente)
+        datos_z = self.transformar_datos(datos, parametros)
+        limite_inf_z, limite_sup_z = self.transformar_datos(
+            [self.LIMITE_INFERIOR, self.LIMITE_SUPERIOR], parametros)
+        media_z = np.mean(datos_z)
+        desviacion_z = np.std(datos_z, ddof=1)
+        
+        capacidad['metodo_no_normal'] = parametros['metodo']
+        capacidad['r_qq_transformado'] = parametros['r_qq_transformado']
+        capacidad['pp_transformado'] = (limite_sup_z - limite_inf_z) / (6 * desviacion_z)
+        capacidad['ppk_transformado'] = min((limite_sup_z - media_z) / (3 * desviacion_z),
+                                            (media_z - limite_inf_z) / (3 * desviacion_z))
+        
+        if parametros['metodo'] == 'Box-Cox':
+            capacidad['parametros_transformacion'] = f"λ = {parametros['lambda_boxcox']:.4f}"
+        else:
+            capacidad['parametros_transformacion'] = (
+                f"γ = {parametros['johnson_gamma']:.4f}, δ = {parametros['johnson_delta']:.4f}, "
+                f"ξ = {parametros['johnson_xi']:.4f}, λ = {parametros['johnson_lambda']:.4f}")
+        
+        # Percentiles ISO 22514 tomados de la distribución ajustada
+        puntos = self.calcular_percentiles_ajustados(parametros, media_z, desviacion_z)
+        if puntos is None:
+            self.asignar_percentiles_empiricos(datos, capacidad)
+        else:
+            capacidad['pp_percentil'], capacidad['ppk_percentil'] = self.calcular_capacidad_percentiles(*puntos)
+            capacidad['origen_percentiles'] = f"Ajuste {parametros['metodo']}"
+        
+        return capacidad
+    
+    def asignar_percentiles_empiricos(self, datos, capacidad):
+        """Usa percentiles empíricos solo si hay datos suficientes para estimar las colas"""
+        if len(datos) < self.MINIMO_PERCENTILES_EMPIRICOS:
+            print(f"⚠️  Percentiles ISO 22514 omitidos: {len(datos)} datos "
+                  f"(mínimo {self.MINIMO_PERCENTILES_EMPIRICOS} sin ajuste de distribución)")
+            capacidad['origen_percentiles'] = 'No calculado'
+            return
+        
+        puntos = np.percentile(datos, [0.135, 50, 99.865])
+        capacidad['pp_percentil'], capacidad['ppk_percentil'] = self.calcular_capacidad_percentiles(*puntos)
+        capacidad['origen_percentiles'] = 'Empíricos'
+        if capacidad['metodo_no_normal'] == 'Sin ajuste':
+            capacidad['metodo_no_normal'] = 'Percentiles ISO 22514'
+    
     def generar_graficas_minitab(self, stats_dict):
         """Genera 6 gráficas profesionales tipo Minitab con indicadores de capacidad"""
+        self.crear_figura_minitab(stats_dict)
+        plt.show()
+    
+    def crear_figura_minitab(self, stats_dict):
+        """Construye la figura con los 6 paneles Minitab sin mostrarla"""
         todos_datos = self.matriz_concentraciones.values.flatten()
         todos_datos = todos_datos[~np.isnan(todos_datos)]
         media = stats_dict['media']
@@ -277,6 +508,11 @@ class AnalizadorEstadisticoProcesos:
         normalidad_text += f"Asimetría: {stats_dict['asimetria']:.3f}\n"
         normalidad_text += f"Curtosis: {stats_dict['curtosis']:.3f}\n"
         normalidad_text += f"Cpk: {stats_dict['cpk']:.2f} | Ppk: {stats_dict['ppk']:.2f}"
+        if not stats_dict['es_normal']:
+            if not np.isnan(stats_dict['ppk_percentil']):
+                normalidad_text += f"\nPpk percentil: {stats_dict['ppk_percentil']:.2f}"
+            if not np.isnan(stats_dict['ppk_transformado']):
+                normalidad_text += f"\nPpk {stats_dict['metodo_no_normal']}: {stats_dict['ppk_transformado']:.2f}"
         ax4.text(0.05, 0.95, normalidad_text, transform=ax4.transAxes, 
                 bbox=dict(boxstyle="round", facecolor="wheat"), verticalalignment='top', fontsize=9)
         
@@ -327,8 +563,8 @@ class AnalizadorEstadisticoProcesos:
                 bbox=dict(boxstyle="round", facecolor="lightcoral", alpha=0.8),
                 verticalalignment='top', fontsize=9)
         
-        plt.tight_layout()
-        plt.show()
+        fig.tight_layout()
+        return fig
     
     def generar_reporte_estadistico(self, stats_dict):
         """Genera reporte estadístico completo diferenciando Cp vs Pp"""
@@ -393,6 +629,20 @@ class AnalizadorEstadisticoProcesos:
         print(f"   Total dentro especificación: {stats_dict['dentro_espec']:.2f}%")
         print(f"   PPM (Partes Por Millón): {stats_dict['ppm']:,.0f}")
         
+        if not stats_dict['es_normal']:
+            print(f"\n🔀 CAPACIDAD NO NORMAL (Shapiro-Wilk p = {stats_dict['normalidad_p_value']:.4f}):")
+            print(f"   Producto: {self.producto}")
+            if not np.isnan(stats_dict['ppk_percentil']):
+                print(f"   Percentiles ISO 22514 ({stats_dict['origen_percentiles']}) → Pp: {stats_dict['pp_percentil']:.3f} | Ppk: {stats_dict['ppk_percentil']:.3f}")
+            else:
+                print(f"   Percentiles ISO 22514: no calculados (pocos datos y sin ajuste de distribución)")
+            if not np.isnan(stats_dict['ppk_transformado']):
+                print(f"   Transformación {stats_dict['metodo_no_normal']}: {stats_dict['parametros_transformacion']}")
+                print(f"   Ajuste Q-Q (r): {stats_dict['r_qq_transformado']:.4f}")
+                print(f"   Transformado → Pp: {stats_dict['pp_transformado']:.3f} | Ppk: {stats_dict['ppk_transformado']:.3f}")
+            if not (np.isnan(stats_dict['ppk_percentil']) and np.isnan(stats_dict['ppk_transformado'])):
+                print(f"   💡 Usar estos índices en lugar de Cp/Cpk normales")
+        
         print(f"\n🎯 RECOMENDACIONES ESTRATÉGICAS:")
         if stats_dict['cp'] > stats_dict['pp']:
             print(f"   • 🔧 PRIORIDAD: Reducir variación ENTRE subgrupos")
@@ -404,7 +654,7 @@ class AnalizadorEstadisticoProcesos:
         else:
             print(f"   • ✅ CENTRADO: Proceso bien centrado")
     
-    def analizar_completo(self):
+    def analizar_completo(self, mostrar_graficas=True):
         """Ejecuta análisis completo con matriz de concentraciones"""
         if not self.cargar_matriz_concentraciones():
             return
@@ -416,8 +666,9 @@ class AnalizadorEstadisticoProcesos:
         self.generar_reporte_estadistico(stats_dict)
         
         # Generar gráficas
-        print(f"\n📈 Generando 6 gráficas Minitab avanzadas...")
-        self.generar_graficas_minitab(stats_dict)
+        if mostrar_graficas:
+            print(f"\n📈 Generando 6 gráficas Minitab avanzadas...")
+            self.generar_graficas_minitab(stats_dict)
         
         # Guardar reporte estadístico
         df_reporte = pd.DataFrame([stats_dict])
@@ -431,7 +682,9 @@ if __name__ == "__main__":
     print("🚀 INICIANDO ANÁLISIS ESTADÍSTICO AVANZADO - VERSIÓN 2")
     print("📝 Nota: Este análisis usa la MATRIZ de concentraciones y calcula Cp/Pp correctamente")
     
-    analizador = AnalizadorEstadisticoProcesos()
+    # Uso: python AnalizadorEstadistico_Procesos.py [producto]
+    producto = sys.argv[1] if len(sys.argv) > 1 else "General"
+    analizador = AnalizadorEstadisticoProcesos(producto)
     resultados = analizador.analizar_completo()
     
     if resultados:
@@ -444,5 +697,7 @@ if __name__ == "__main__":
         print(f"📈 {resultados['n_datos']} datos analizados en {resultados['n_subgrupos']} subgrupos")
         print(f"🔷 Cp (Within): {resultados['cp']:.3f} | Cpk: {resultados['cpk']:.3f}")
         print(f"🔶 Pp (Overall): {resultados['pp']:.3f} | Ppk: {resultados['ppk']:.3f}")
+        if not resultados['es_normal']:
+            print(f"🔀 Ppk no normal ({resultados['metodo_no_normal']}): {resultados['ppk_transformado']:.3f} | Ppk percentil: {resultados['ppk_percentil']:.3f}")
         print(f"📊 Dentro de especificación: {resultados['dentro_espec']:.1f}%")
         print(f"{'='*80}")
\ No newline at end of file
@@ -0,0 +1,212 @@
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+import base64
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+
+from LaboratorioVirtual_Concentraciones import LaboratorioVirtualConcentraciones
+from AnalizadorEstadistico_Procesos import AnalizadorEstadisticoProcesos
+
+class GeneradorReporteQC:
+    # Incrementar si cambia el código de las gráficas para invalidar la caché
+    VERSION_FIGURAS = 1
+    MAXIMO_ERRORES_REPORTE = 100  # Filas de celdas inválidas mostradas en el HTML
+    
+    def __init__(self, archivo_datos="datos_laboratorio.xlsx", producto="General", directorio_cache="cache_figuras"):
+        self.archivo_datos = archivo_datos
+        self.producto = producto
+        self.directorio_cache = directorio_cache
+        # Cada producto y archivo de datos tiene su propio juego de figuras en la caché
+        origen = os.path.splitext(os.path.basename(archivo_datos))[0]
+        self.prefijo_cache = re.sub(r'[^\w.-]+', '_', f"{producto}_{origen}")
+        
+        print(f"📑 GENERADOR DE REPORTE QC CONSOLIDADO")
+        print(f"📁 Datos: {archivo_datos} | Producto: {producto}")
+    
+    def calcular_huella(self, *partes):
+        """Calcula un hash SHA-1 del contenido de los datos de entrada de una figura"""
+        huella = hashlib.sha1(f"v{self.VERSION_FIGURAS}".encode())
+        
+        for parte in partes:
+            if isinstance(parte, pd.DataFrame):
+                huella.update(pd.util.hash_pandas_object(parte, index=True).values.tobytes())
+                huella.update(repr(parte.columns.tolist()).encode())
+            elif isinstance(parte, np.ndarray) and parte.dtype != object:
+                huella.update(f"{parte.dtype}{parte.shape}".encode())
+                huella.update(np.ascontiguousarray(parte).tobytes())
+            else:
+                # JSON normaliza tipos numpy y nativos (np.float64 vs float leído de Excel)
+                huella.update(json.dumps(parte, sort_keys=True, default=lambda v: v.item() if hasattr(v, 'item') else str(v)).encode())
+        
+        return huella.hexdigest()
+    
+    def obtener_figura(self, nombre, huella, crear_figura):
+        """Devuelve la figura en PNG base64, renderizándola solo si no está en caché"""
+        os.makedirs(self.directorio_cache, exist_ok=True)
+        ruta = os.path.join(self.directorio_cache, f"{self.prefijo_cache}_{nombre}_{huella[:16]}.png")
+        
+        if os.path.exists(ruta):
+            print(f"   ♻️  {nombre}: figura reutilizada desde caché")
+        else:
+            fig = crear_figura()
+            fig.savefig(ruta, dpi=100, bbox_inches='tight')
+            plt.close(fig)
+            print(f"   🖼️  {nombre}: figura renderizada y guardada en caché")
+            self.limpiar_cache(nombre, ruta)
+        
+        with open(ruta, 'rb') as f:
+            return base64.b64encode(f.read()).decode('ascii')
+    
+    def limpiar_cache(self, nombre, ruta_actual):
+        """Elimina las versiones anteriores de una figura del mismo producto y archivo de datos"""
+        patron = re.compile(re.escape(f"{self.prefijo_cache}_{nombre}") + r'_[0-9a-f]{16}\.png')
+        
+        for archivo in os.listdir(self.directorio_cache):
+            ruta = os.path.join(self.directorio_cache, archivo)
+            if patron.fullmatch(archivo) and ruta != ruta_actual:
+                os.remove(ruta)
+    
+    def tabla_capacidad(self, stats_dict):
+        """Resume los indicadores de capacidad en una tabla (Indicador, Valor)"""
+        filas = [
+            ('Total de datos', f"{stats_dict['n_datos']}"),
+            ('Subgrupos / Lotes', f"{stats_dict['n_subgrupos']} / {stats_dict['n_lotes']}"),
+            ('Media (M)', f"{stats_dict['media']:.4f}"),
+            ('Desviación Pooled (M)', f"{stats_dict['desviacion_pooled']:.4f}"),
+            ('Desviación Overall (M)', f"{stats_dict['desviacion_overall']:.4f}"),
+            ('Cp / Cpk', f"{stats_dict['cp']:.3f} / {stats_dict['cpk']:.3f}"),
+            ('Pp / Ppk', f"{stats_dict['pp']:.3f} / {stats_dict['ppk']:.3f}"),
+            ('PPM fuera de especificación', f"{stats_dict['ppm']:,.0f}"),
+            ('Dentro de especificación', f"{stats_dict['dentro_espec']:.2f}%"),
+            ('Shapiro-Wilk p', f"{stats_dict['normalidad_p_value']:.4f}"),
+            ('¿Normal?', 'SÍ' if stats_dict['es_normal'] else 'NO')
+        ]
+        
+        if not stats_dict['es_normal']:
+            if not np.isnan(stats_dict['ppk_percentil']):
+                filas.append((f"Pp / Ppk percentiles ISO 22514 ({stats_dict['origen_percentiles']})",
+                              f"{stats_dict['pp_percentil']:.3f} / {stats_dict['ppk_percentil']:.3f}"))
+            if not np.isnan(stats_dict['ppk_transformado']):
+                filas.append((f"Transformación {stats_dict['metodo_no_normal']}",
+                              stats_dict['parametros_transformacion']))
+                filas.append(('Pp / Ppk transformados',
+                              f"{stats_dict['pp_transformado']:.3f} / {stats_dict['ppk_transformado']:.3f}"))
+        
+        return pd.DataFrame(filas, columns=['Indicador', 'Valor'])
+    
+    def construir_html(self, resultados_lab, stats_dict, figura_lotes, figura_capacidad, limites):
+        """Arma el documento HTML autocontenido con tablas y figuras embebidas"""
+        calibracion = resultados_lab['ecuacion_calibracion']
+        df_lotes = pd.DataFrame(resultados_lab['resultados_lotes'])
+        errores = resultados_lab['errores_celdas']
+        
+        secciones = []
+        
+        secciones.append(f"""
+<h2>1. Curva de calibración</h2>
+<p>A = {calibracion['pendiente']:.4f}·C + {calibracion['intercepto']:.4f} &nbsp;|&nbsp; R² = {calibracion['r_cuadrado']:.4f}</p>
+""")
+        
+        secciones.append(f"""
+<h2>2. Resultados por lote</h2>
+{df_lotes.to_html(index=False, float_format=lambda x: f'{x:.4f}')}
+""")
+        
+        if len(errores) == 0:
+            tabla_errores = "<p>Sin celdas inválidas.</p>"
+        else:
+            tabla_errores = errores.head(self.MAXIMO_ERRORES_REPORTE).to_html(index=False)
+            if len(errores) > self.MAXIMO_ERRORES_REPORTE:
+                tabla_errores = (f"<p>Mostrando {self.MAXIMO_ERRORES_REPORTE} de {len(errores)} celdas inválidas; "
+                                 f"la lista completa está en errores_celdas.xlsx.</p>\n{tabla_errores}")
+        
+        secciones.append(f"""
+<h2>3. Celdas inválidas ({len(errores)})</h2>
+{tabla_errores}
+""")
+        
+        secciones.append(f"""
+<h2>4. Capacidad del proceso</h2>
+<p>Límites: {limites[0]:.3f} M – {limites[1]:.3f} M &nbsp;|&nbsp; Objetivo: {limites[2]:.3f} M</p>
+{self.tabla_capacidad(stats_dict).to_html(index=False)}
+""")
+        
+        secciones.append(f"""
+<h2>5. Gráficas</h2>
+<h3>Calibración, concentraciones y CV por lote</h3>
+<img src="data:image/png;base64,{figura_lotes}" alt="Calibración y lotes">
+<h3>Análisis Minitab de capacidad</h3>
+<img src="data:image/png;base64,{figura_capacidad}" alt="Capacidad Minitab">
+""")
+        
+        return f"""<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>Reporte QC - {html.escape(self.producto)}</title>
+<style>
+body {{ font-family: Arial, sans-serif; margin: 2em; color: #222; }}
+table {{ border-collapse: collapse; margin-bottom: 1em; }}
+th, td {{ border: 1px solid #999; padding: 4px 10px; text-align: right; }}
+th {{ background: #e8eef6; }}
+img {{ max-width: 100%; }}
+</style>
+</head>
+<body>
+<h1>Reporte de Control de Calidad - {html.escape(self.producto)}</h1>
+<p>Datos: {html.escape(self.archivo_datos)} &nbsp;|&nbsp; Generado: {pd.Timestamp.now():%Y-%m-%d %H:%M}</p>
+{''.join(secciones)}
+</body>
+</html>
+"""
+    
+    def generar_reporte(self, archivo_salida="reporte_QC.html"):
+        """Ejecuta ambos análisis y genera el reporte HTML consolidado"""
+        laboratorio = LaboratorioVirtualConcentraciones(self.archivo_datos)
+        resultados_lab = laboratorio.analizar_todo_automatico(mostrar_graficas=False)
+        if resultados_lab is None:
+            return None
+        
+        analizador = AnalizadorEstadisticoProcesos(self.producto)
+        stats_dict = analizador.analizar_completo(mostrar_graficas=False)
+        if stats_dict is None:
+            return None
+        
+        print(f"\n🖼️  PREPARANDO FIGURAS (caché: {self.directorio_cache})...")
+        
+        huella_lotes = self.calcular_huella(
+            laboratorio.concentraciones, laboratorio.absorbancias, resultados_lab['resultados_lotes'])
+        figura_lotes = self.obtener_figura(
+            'calibracion_lotes', huella_lotes,
+            lambda: laboratorio.crear_figura_resultados(resultados_lab['resultados_lotes']))
+        
+        limites = (analizador.LIMITE_INFERIOR, analizador.LIMITE_SUPERIOR, analizador.OBJETIVO)
+        huella_capacidad = self.calcular_huella(analizador.matriz_concentraciones, stats_dict, limites)
+        figura_capacidad = self.obtener_figura(
+            'capacidad_minitab', huella_capacidad,
+            lambda: analizador.crear_figura_minitab(stats_dict))
+        
+        contenido = self.construir_html(resultados_lab, stats_dict, figura_lotes, figura_capacidad, limites)
+        with open(archivo_salida, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        
+        print(f"\n💾 Reporte QC consolidado guardado en: '{archivo_salida}'")
+        return archivo_salida
+
+# 🎯 EJECUCIÓN DEL GENERADOR
+if __name__ == "__main__":
+    # Uso: python GeneradorReporte_QC.py [producto]
+    producto = sys.argv[1] if len(sys.argv) > 1 else "General"
+    generador = GeneradorReporteQC("datos_laboratorio.xlsx", producto)
+    archivo = generador.generar_reporte()
+    
+    if archivo:
+        print(f"\n{'='*80}")
+        print("🎉 REPORTE QC GENERADO CON ÉXITO!")
+        print(f"📑 Calibración, lotes, capacidad y 9 gráficas en '{archivo}'")
+        print(f"{'='*80}")
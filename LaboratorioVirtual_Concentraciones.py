@@ -2,10 +2,28 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy import stats
+import re
 
 class LaboratorioVirtualConcentraciones:
+    # Réplica: número (punto o coma decimal) con unidad opcional, p.ej. "0,523 AU"
+    PATRON_REPLICA = re.compile(r'^([-+]?(?:\d+(?:[.,]\d*)?|[.,]\d+)(?:[eE][-+]?\d+)?)\s*([^\d\s]*)$')
+    # Separadores sin ambigüedad: ";", coma seguida/precedida de espacio, o espacios
+    PATRON_SEPARADOR = re.compile(r'\s*;\s*|\s*,\s+|\s+,\s*|\s+')
+    PATRON_DIGITO = re.compile(r'\d')
+    # Casos más frecuentes resueltos con una sola expresión: listas con punto decimal
+    # ("0.52, 0.53") o con coma decimal ("0,52; 0,53 AU"), con unidad válida opcional
+    _UNIDAD = r'(?:\s*(?i:au|a\.u\.|ua|u\.a\.|abs))?'
+    _NUM_PUNTO = r'[-+]?(?:\d*\.\d+|\d+\.\d*)(?:[eE][-+]?\d+)?' + _UNIDAD
+    _NUM_COMA = r'[-+]?\d*,\d+(?:[eE][-+]?\d+)?' + _UNIDAD
+    PATRON_LISTA_PUNTO = re.compile(
+        rf'\s*({_NUM_PUNTO})(?:(?:\s*[;,]\s*|\s+){_NUM_PUNTO})*\s*')
+    PATRON_LISTA_COMA = re.compile(
+        rf'\s*({_NUM_COMA})(?:(?:\s*;\s*|\s*,\s+|\s+,\s*|\s+){_NUM_COMA})*\s*')
+    UNIDADES_VALIDAS = {'', 'au', 'a.u.', 'ua', 'u.a.', 'abs'}
+    
     def __init__(self, archivo_datos="datos_laboratorio.xlsx"):
         self.archivo_datos = archivo_datos
+        self.cache_celdas = {}  # {texto original: (absorbancia, motivo de error)}
         print(f"🔬 LABORATORIO VIRTUAL - ANALIZADOR DE CONCENTRACIONES")
         print(f"📁 Leyendo datos desde: {archivo_datos}")
     
@@ -41,11 +59,161 @@ class LaboratorioVirtualConcentraciones:
             print(f"❌ Error cargando muestras matriciales: {e}")
             return False
     
+    def separar_replicas(self, texto):
+        """Divide un texto de réplicas distinguiendo separadores de comas decimales
+        
+        Devuelve (réplicas, motivo de error); las réplicas conservan su unidad.
+        """
+        replicas = []
+        
+        for token in self.PATRON_SEPARADOR.split(texto):
+            if token and not self.PATRON_DIGITO.search(token) and replicas:
+                # "0.52 AU" → la unidad separada por espacio pertenece a la réplica anterior
+                replicas[-1] += ' ' + token
+                continue
+            
+            if ',' not in token:
+                replicas.append(token)
+                continue
+            
+            # Coma sin espacios: decimal ("0,52") o separador ("0.52,0.53")
+            partes = token.split(',')
+            con_punto = sum('.' in parte for parte in partes)
+            
+            if '' in partes:
+                return None, 'réplica vacía'
+            if len(partes) == 2 and con_punto == 0:
+                replicas.append(token)
+            elif con_punto == len(partes):
+                replicas.extend(partes)
+            elif con_punto == 0:
+                # "0,5,0,6" → no se puede distinguir separador de coma decimal
+                return None, 'separador ambiguo'
+            else:
+                # "1,234.5" → separador de miles o mezcla de formatos
+                return None, 'número con , y . mezclados'
+        
+        return replicas, None
+    
+    def parsear_celda_texto(self, texto):
+        """Convierte un texto de réplicas en (primera absorbancia, motivo de error)"""
+        if texto in self.cache_celdas:
+            return self.cache_celdas[texto]
+        
+        simple = self.PATRON_LISTA_PUNTO.fullmatch(texto) or self.PATRON_LISTA_COMA.fullmatch(texto)
+        if simple is not None:
+            primera = self.PATRON_REPLICA.match(simple.group(1).strip())
+            resultado = (float(primera.group(1).replace(',', '.')), None)
+            self.cache_celdas[texto] = resultado
+            return resultado
+        
+        resultado = (np.nan, None)
+        limpio = texto.strip()
+        
+        if limpio:
+            replicas, motivo = self.separar_replicas(limpio)
+            valores = []
+            
+            if motivo is not None:
+                resultado = (np.nan, motivo)
+                replicas = []
+            
+            for replica in replicas:
+                coincidencia = self.PATRON_REPLICA.match(replica)
+                if not replica:
+                    resultado = (np.nan, 'réplica vacía')
+                    break
+                if coincidencia is None:
+                    resultado = (np.nan, 'formato no numérico')
+                    break
+                if coincidencia.group(2).lower() not in self.UNIDADES_VALIDAS:
+                    resultado = (np.nan, f'unidad desconocida: {coincidencia.group(2)}')
+                    break
+                valor = float(coincidencia.group(1).replace(',', '.'))
+                if not np.isfinite(valor):
+                    resultado = (np.nan, 'valor no finito')
+                    break
+                valores.append(valor)
+            else:
+                if valores:
+                    # Se conserva el criterio original: la primera réplica es la absorbancia
+                    resultado = (valores[0], None)
+        
+        self.cache_celdas[texto] = resultado
+        return resultado
+    
+    def convertir_absorbancias(self, matriz):
+        """Convierte la matriz de celdas (números o textos con réplicas) a absorbancias numéricas
+        
+        Devuelve la matriz numérica y un DataFrame con las celdas inválidas
+        (Subgrupo, Lote, Valor_Original, Motivo).
+        """
+        matriz = np.asarray(matriz)
+        valores_originales = matriz.ravel()
+        absorbancias = np.full(matriz.size, np.nan)
+        motivos = np.full(matriz.size, None, dtype=object)
+        
+        if matriz.dtype.kind in 'fiu':
+            # Matriz puramente numérica: no hay textos ni booleanos que revisar
+            absorbancias = matriz.astype(float).ravel()
+            textos = np.array([], dtype=int)
+        else:
+            # Se separan textos y números por tipo: to_numeric es lento con columnas mezcladas
+            tipos = pd.Series(valores_originales, dtype=object).map(type)
+            es_texto = tipos.isin([str, np.str_]).to_numpy()
+            textos = np.flatnonzero(es_texto)
+            numeros = np.flatnonzero(~es_texto)
+            
+            absorbancias[numeros] = pd.to_numeric(
+                pd.Series(valores_originales[numeros], dtype=object), errors='coerce').to_numpy(dtype=float)
+            
+            # Celdas con datos que no son ni texto ni número (fechas, objetos...)
+            no_numericos = numeros[np.isnan(absorbancias[numeros]) & pd.notna(valores_originales[numeros])]
+            motivos[no_numericos] = 'tipo no numérico'
+            
+            # Un booleano solo puede haberse convertido en 0 o 1
+            candidatos = numeros[(absorbancias[numeros] == 0) | (absorbancias[numeros] == 1)]
+            es_booleano = candidatos[tipos.iloc[candidatos].isin([bool, np.bool_]).to_numpy()]
+            motivos[es_booleano] = 'valor booleano'
+            absorbancias[es_booleano] = np.nan
+        
+        if len(textos) > 0:
+            # Cada texto distinto se analiza una sola vez
+            codigos, unicos = pd.factorize(valores_originales[textos])
+            valores_unicos = pd.to_numeric(pd.Series(unicos, dtype=object), errors='coerce').to_numpy(dtype=float, copy=True)
+            motivos_unicos = np.full(len(unicos), None, dtype=object)
+            
+            # Solo los textos que no son un número simple pasan por el parser de réplicas
+            por_parsear = np.flatnonzero(np.isnan(valores_unicos))
+            if len(por_parsear) > 0:
+                parseados = [self.parsear_celda_texto(texto) for texto in unicos[por_parsear].tolist()]
+                valores_unicos[por_parsear] = [valor for valor, _ in parseados]
+                motivos_unicos[por_parsear] = [motivo for _, motivo in parseados]
+            
+            absorbancias[textos] = valores_unicos[codigos]
+            motivos[textos] = motivos_unicos[codigos]
+        
+        # "inf" pasa por to_numeric pero no es una absorbancia válida
+        no_finitos = np.flatnonzero(np.isinf(absorbancias))
+        motivos[no_finitos] = 'valor no finito'
+        absorbancias[no_finitos] = np.nan
+        
+        posiciones = np.flatnonzero(pd.notna(motivos))
+        filas, columnas = np.divmod(posiciones, matriz.shape[1])
+        errores = pd.DataFrame({
+            'Subgrupo': np.asarray(self.subgrupos, dtype=object)[filas],
+            'Lote': np.asarray(self.lotes, dtype=object)[columnas],
+            'Valor_Original': valores_originales[posiciones],
+            'Motivo': motivos[posiciones]
+        })
+        
+        return absorbancias.reshape(matriz.shape), errores
+    
     def calcular_concentracion_desde_absorbancia(self, absorbancia, pendiente, intercepto):
         """Calcula concentración usando la ecuación de calibración"""
         return (absorbancia - intercepto) / pendiente
     
-    def analizar_todo_automatico(self):
+    def analizar_todo_automatico(self, mostrar_graficas=True):
         """Analiza TODO automáticamente desde Excel - MANTIENE ESTRUCTURA MATRICIAL"""
         if not self.cargar_calibracion() or not self.cargar_muestras_matricial():
             return None
@@ -65,27 +233,15 @@ class LaboratorioVirtualConcentraciones:
         
         # 2. Convertir TODA la matriz de absorbancias a concentraciones
         print(f"\n🔍 CONVIRTIENDO MATRIZ DE ABSORBANCIAS A CONCENTRACIONES...")
-        matriz_concentraciones = np.zeros_like(self.matriz_absorbancias)
+        matriz_absorbancias_num, self.errores_celdas = self.convertir_absorbancias(self.matriz_absorbancias)
+        matriz_concentraciones = self.calcular_concentracion_desde_absorbancia(matriz_absorbancias_num, m, b)
         
-        for i in range(len(self.subgrupos)):
-            for j in range(len(self.lotes)):
-                absorbancias_str = self.matriz_absorbancias[i, j]
-                
-                # Procesar valor (puede ser string o número)
-                if pd.isna(absorbancias_str):
-                    concentracion = np.nan
-                elif isinstance(absorbancias_str, str):
-                    # Si es string, tomar el primer valor
-                    try:
-                        abs_val = float(absorbancias_str.split(",")[0].strip())
-                        concentracion = self.calcular_concentracion_desde_absorbancia(abs_val, m, b)
-                    except:
-                        concentracion = np.nan
-                else:
-                    # Si es número directamente
-                    concentracion = self.calcular_concentracion_desde_absorbancia(float(absorbancias_str), m, b)
-                
-                matriz_concentraciones[i, j] = concentracion
+        if len(self.errores_celdas) > 0:
+            print(f"⚠️  {len(self.errores_celdas)} celdas inválidas convertidas a NaN:")
+            for motivo, cantidad in self.errores_celdas['Motivo'].value_counts().items():
+                print(f"   • {motivo}: {cantidad}")
+        else:
+            print(f"✅ Todas las celdas con datos se convirtieron correctamente")
         
         # 3. Calcular estadísticas por lote
         print(f"\n📊 CALCULANDO ESTADÍSTICAS POR LOTE:")
@@ -121,7 +277,7 @@ class LaboratorioVirtualConcentraciones:
                     todos_datos_individuales.append({
                         'Subgrupo': subgrupo,
                         'Lote': lote,
-                        'Absorbancia': self.matriz_absorbancias[i, j],
+                        'Absorbancia': matriz_absorbancias_num[i, j],
                         'Concentracion_Individual': matriz_concentraciones[i, j]
                     })
         
@@ -130,12 +286,14 @@ class LaboratorioVirtualConcentraciones:
         
         # 5. Generar reporte y gráficos
         self.generar_reporte_final(resultados_lotes)
-        self.graficar_resultados(resultados_lotes)
+        if mostrar_graficas:
+            self.graficar_resultados(resultados_lotes)
         
         return {
             'resultados_lotes': resultados_lotes,
             'matriz_concentraciones': matriz_concentraciones,
             'datos_individuales': todos_datos_individuales,
+            'errores_celdas': self.errores_celdas,
             'ecuacion_calibracion': {'pendiente': m, 'intercepto': b, 'r_cuadrado': r_cuadrado}
         }
     
@@ -166,11 +324,16 @@ class LaboratorioVirtualConcentraciones:
         })
         info_calibracion.to_excel('info_calibracion.xlsx', index=False)
         
+        # 5. CELDAS INVÁLIDAS (índice de errores de conversión)
+        # Se escribe siempre para no dejar errores de una ejecución anterior
+        self.errores_celdas.to_excel('errores_celdas.xlsx', index=False)
+        
         print(f"\n💾 ARCHIVOS GUARDADOS (ESTRUCTURA MATRICIAL):")
         print(f"   • matriz_concentraciones.xlsx - MISMA ESTRUCTURA que tu Excel original")
         print(f"   • datos_individuales_completos.xlsx - Todos los datos en formato largo")
         print(f"   • resultados_por_lote.xlsx - Resumen estadístico por lote")
         print(f"   • info_calibracion.xlsx - Información de la curva de calibración")
+        print(f"   • errores_celdas.xlsx - Celdas inválidas (subgrupo, lote, valor, motivo): {len(self.errores_celdas)}")
     
     def generar_reporte_final(self, resultados):
         """Genera reporte ejecutivo"""
@@ -200,6 +363,11 @@ class LaboratorioVirtualConcentraciones:
     
     def graficar_resultados(self, resultados):
         """Genera gráficos profesionales"""
+        self.crear_figura_resultados(resultados)
+        plt.show()
+    
+    def crear_figura_resultados(self, resultados):
+        """Construye la figura de calibración, concentraciones y CV por lote sin mostrarla"""
         fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(18, 6))
         
         # Gráfico 1: Curva de calibración
@@ -252,8 +420,8 @@ class LaboratorioVirtualConcentraciones:
             ax3.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.1, 
                     f'{cv:.1f}%', ha='center', va='bottom', fontsize=8)
         
-        plt.tight_layout()
-        plt.show()
+        fig.tight_layout()
+        return fig
 
 # 🎯 EJECUCIÓN AUTOMÁTICA
 if __name__ == "__main__":